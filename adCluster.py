@@ -0,0 +1,644 @@
+#!/usr/bin/env python3
+"""
+多机分布式批处理 - 协调者 (coordinator) 把PDF任务放入共享队列，任意多台机器上的工作者 (worker) 领取并压缩
+
+共享队列是共享存储 (如NFS) 上的一个目录:
+    config.json                       队列配置 (租约时长)，由协调者写入，工作者读取
+    pending/<任务ID>.json             等待处理
+    leased/<任务ID>@<租约令牌>.json    已被某个工作者领取，文件修改时间即最后一次心跳
+    done/<任务ID>.json                已完成 (包含结果)
+    archive/<时间>/                   协调者开始新一轮时，把上一轮的 done 移到这里
+
+- 领取: 将 pending 中的文件 rename 到 leased 下带唯一令牌的文件名，rename 是原子的，只有一个工作者能成功
+- 心跳: 工作者定期更新租约文件的修改时间
+- 过期: 超过租约时长未心跳的任务先被 rename 为回收者自己的租约，更新后再 rename 回 pending；
+  连续过期达到 max_attempts 次的任务 (例如每次都让工作者崩溃的文件) 直接记为失败写入 done
+- 完成: 工作者将自己的租约文件 rename 为 done/<任务ID>@<令牌>.claimed，之后才把输出替换到输出路径并写入结果；
+  租约已被收回时 rename 失败，结果 (包括输出文件) 被丢弃；写入结果前崩溃留下的 .claimed 过期后会被重新分配
+
+各机器的时钟需要同步 (NTP)，租约时长应远大于时钟误差。
+测试时可以使用本地目录作为队列，或使用进程内的 MemoryQueue。
+
+使用方法:
+    python adCluster.py coordinator 输入目录 输出目录 --queue 队列目录 [-m 压缩方法]
+    python adCluster.py worker --queue 队列目录 [--threads N]
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import hashlib
+import argparse
+import logging
+import threading
+from pathlib import Path
+
+from adMain import compress_pdf
+from adSchedule import CostModel, lpt_schedule
+from adScratch import configure_scratch, parse_size
+from adVerify import DEFAULT_THRESHOLD
+from adWatch import iter_pdf_files
+
+# 配置日志
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE = 120.0
+# 租约过期这么多次后不再重新分配，记为失败
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def new_run_id():
+    """每次入队生成一个批次ID，用于区分不同批次的结果"""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def job_id_for(input_path, output_root):
+    """
+    根据输入文件的绝对路径和输出根目录生成稳定的任务ID，同一文件正在排队或处理时不会重复入队；
+    共用一个队列的不同协调者 (输入或输出目录不同) 的任务互不影响
+    """
+    key = f"{os.path.abspath(input_path)}\0{os.path.abspath(output_root)}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _write_json(path, data):
+    """先写临时文件再rename，保证其他机器不会读到写了一半的文件"""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _pending_name(job):
+    """pending中的文件名带优先级前缀，按文件名排序即为领取顺序"""
+    if "priority" in job:
+        return f"{job['priority']:08d}-{job['id']}.json"
+    return f"{job['id']}.json"
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _abandoned_result(job):
+    """多次租约过期后放弃的任务的结果"""
+    return {
+        "success": False,
+        "compression_ratio": None,
+        "error": f"租约过期 {job['attempts']} 次 (工作者可能在处理该文件时崩溃)，放弃处理",
+        "worker": None,
+        "seconds": None,
+        "lease_lost": True,
+    }
+
+
+class Lease:
+    """工作者持有的租约"""
+
+    def __init__(self, job, token):
+        self.job = job
+        self.token = token
+
+
+class LeaseDirQueue:
+    """
+    基于共享目录的任务队列
+
+    参数:
+    - root: 队列目录
+    - lease_seconds: 租约时长，指定时写入队列配置 (协调者)；为None时从队列配置读取 (工作者)
+    - max_attempts: 租约过期多少次后放弃该任务
+    """
+
+    def __init__(self, root, lease_seconds=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.root = Path(root)
+        self.max_attempts = max_attempts
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.config_path = self.root / "config.json"
+        self._config_mtime = None
+        self._lease_seconds = DEFAULT_LEASE
+        if lease_seconds is not None:
+            self.configure(lease_seconds)
+        self.pending_dir = self.root / "pending"
+        self.leased_dir = self.root / "leased"
+        self.done_dir = self.root / "done"
+        for d in (self.pending_dir, self.leased_dir, self.done_dir):
+            d.mkdir(parents=True, exist_ok=True)
+        self._candidates = []
+        self._lock = threading.Lock()
+
+    @property
+    def lease_seconds(self):
+        """租约时长，队列配置被协调者修改后自动重新读取"""
+        try:
+            mtime = self.config_path.stat().st_mtime_ns
+            if mtime != self._config_mtime:
+                self._lease_seconds = float(_read_json(self.config_path)["lease_seconds"])
+                self._config_mtime = mtime
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        return self._lease_seconds
+
+    def configure(self, lease_seconds):
+        """写入队列配置，正在运行的工作者会在下一次心跳时使用新的租约时长"""
+        _write_json(self.config_path, {"lease_seconds": lease_seconds})
+
+    def _leased_path(self, job_id, token):
+        return self.leased_dir / f"{job_id}@{token}.json"
+
+    def known_ids(self):
+        """正在排队或处理中的任务ID (已完成的任务可以重新入队)"""
+        ids = set(name[:-5].rsplit("-", 1)[-1]
+                  for name in os.listdir(self.pending_dir) if name.endswith(".json"))
+        ids.update(name.split("@", 1)[0] for name in os.listdir(self.leased_dir) if name.endswith(".json"))
+        return ids
+
+    def archive_done(self):
+        """把已完成的结果移到 archive/<时间>/ 下，开始新的一轮"""
+        if not any(name.endswith(".json") for name in os.listdir(self.done_dir)):
+            return
+        archive_dir = self.root / "archive"
+        archive_dir.mkdir(exist_ok=True)
+        os.rename(self.done_dir, archive_dir / new_run_id())
+        self.done_dir.mkdir(exist_ok=True)
+
+    def put(self, job):
+        """放入一个任务，文件名按 job["priority"] 排序，工作者按此顺序领取"""
+        _write_json(self.pending_dir / _pending_name(job), job)
+
+    def claim(self, worker_id):
+        """领取一个任务，队列为空时返回None"""
+        while True:
+            with self._lock:
+                if not self._candidates:
+                    self._candidates = sorted(
+                        name for name in os.listdir(self.pending_dir) if name.endswith(".json"))
+                    if not self._candidates:
+                        return None
+                name = self._candidates.pop(0)
+            token = f"{worker_id}-{uuid.uuid4().hex[:8]}"
+            job_id = name[:-5].rsplit("-", 1)[-1]
+            target = self._leased_path(job_id, token)
+            try:
+                os.rename(self.pending_dir / name, target)
+            except FileNotFoundError:
+                # 已被其他工作者领取
+                continue
+            try:
+                # 立即心跳一次以开始计算租约
+                os.utime(target)
+                job = _read_json(target)
+            except FileNotFoundError:
+                continue
+            return Lease(job, token)
+
+    def heartbeat(self, lease):
+        """续约，租约已被收回时返回False"""
+        try:
+            os.utime(self._leased_path(lease.job["id"], lease.token))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def complete(self, lease, result, publish=None):
+        """
+        提交结果，租约已被收回时返回False
+        publish(result) 在提交点之后、写入结果之前调用 (例如把输出文件替换到位)，返回最终的结果
+        """
+        leased_path = self._leased_path(lease.job["id"], lease.token)
+        # rename 是提交点: 成功则租约归本工作者所有，不会再被回收
+        claimed_path = self.done_dir / f"{lease.job['id']}@{lease.token}.claimed"
+        try:
+            os.rename(leased_path, claimed_path)
+        except FileNotFoundError:
+            return False
+        if publish is not None:
+            result = publish(result)
+        _write_json(self.done_dir / f"{lease.job['id']}.json", dict(lease.job, result=result))
+        os.remove(claimed_path)
+        return True
+
+    def _expired(self, entry, now):
+        st = entry.stat()
+        # rename 不改变修改时间但会更新ctime，刚被领取的任务以ctime为准
+        return now - max(st.st_mtime, st.st_ctime) >= self.lease_seconds
+
+    def _requeue(self, path, job_id):
+        """
+        把过期的租约放回pending，过期次数达到上限时改为写入失败结果
+        先rename为回收者自己的租约 (原子操作，只有一个回收者成功)，在私有文件中更新重试次数，
+        最后一次rename发布到pending，任务任何时刻都只处于一个状态
+
+        返回:
+        - 任务
+        - 是否已放弃
+        """
+        private_path = self._leased_path(job_id, f"reaper-{uuid.uuid4().hex[:8]}")
+        os.rename(path, private_path)
+        job = _read_json(private_path)
+        job["attempts"] = job.get("attempts", 0) + 1
+        if job["attempts"] >= self.max_attempts:
+            _write_json(self.done_dir / f"{job_id}.json", dict(job, result=_abandoned_result(job)))
+            os.remove(private_path)
+            return job, True
+        _write_json(private_path, job)
+        os.rename(private_path, self.pending_dir / _pending_name(job))
+        return job, False
+
+    @staticmethod
+    def _log_requeued(job, abandoned, reason):
+        if abandoned:
+            logger.error(f"{reason}，已达 {job['attempts']} 次，放弃处理: {job['rel_path']}")
+        else:
+            logger.warning(f"{reason}，重新分配: {job['rel_path']}")
+
+    def reap_expired(self):
+        """将过期的租约放回pending (过期次数达到上限的记为失败)，返回处理的过期任务数"""
+        now = time.time()
+        reaped = 0
+        for entry in os.scandir(self.leased_dir):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                if not self._expired(entry, now):
+                    continue
+                job, abandoned = self._requeue(entry.path, entry.name.split("@", 1)[0])
+            except (FileNotFoundError, ValueError):
+                continue
+            self._log_requeued(job, abandoned, "租约过期")
+            reaped += 1
+
+        # 工作者在提交点之后、写入结果之前崩溃时留下的 .claimed
+        for entry in os.scandir(self.done_dir):
+            if not entry.name.endswith(".claimed"):
+                continue
+            try:
+                if not self._expired(entry, now):
+                    continue
+                job_id = entry.name.split("@", 1)[0]
+                claimed_job = _read_json(entry.path)
+                done_path = self.done_dir / f"{job_id}.json"
+                if done_path.exists() and _read_json(done_path).get("run") == claimed_job.get("run"):
+                    # 结果已写入，只是没来得及删除 .claimed
+                    os.remove(entry.path)
+                    continue
+                job, abandoned = self._requeue(entry.path, job_id)
+            except (FileNotFoundError, ValueError):
+                continue
+            self._log_requeued(job, abandoned, "任务结果丢失")
+            reaped += 1
+        return reaped
+
+    def counts(self):
+        return {
+            "pending": sum(1 for n in os.listdir(self.pending_dir) if n.endswith(".json")),
+            "leased": sum(1 for n in os.listdir(self.leased_dir) if n.endswith(".json"))
+                      + sum(1 for n in os.listdir(self.done_dir) if n.endswith(".claimed")),
+            "done": sum(1 for n in os.listdir(self.done_dir) if n.endswith(".json")),
+        }
+
+    def results(self):
+        for entry in os.scandir(self.done_dir):
+            if entry.name.endswith(".json"):
+                try:
+                    yield _read_json(entry.path)
+                except (OSError, ValueError):
+                    continue
+
+
+class MemoryQueue:
+    """进程内的队列，接口与 LeaseDirQueue 相同，用于本地测试"""
+
+    def __init__(self, lease_seconds=DEFAULT_LEASE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.pending = []
+        self.leased = {}   # 任务ID -> (令牌, 任务, 最后心跳时间)
+        self.done = {}
+        self.archived = []
+        self._lock = threading.Lock()
+
+    def known_ids(self):
+        with self._lock:
+            return {j["id"] for j in self.pending} | set(self.leased)
+
+    def archive_done(self):
+        with self._lock:
+            if self.done:
+                self.archived.append(self.done)
+                self.done = {}
+
+    def put(self, job):
+        with self._lock:
+            self.pending.append(job)
+            self.pending.sort(key=lambda j: j.get("priority", 0))
+
+    def claim(self, worker_id):
+        with self._lock:
+            if not self.pending:
+                return None
+            job = self.pending.pop(0)
+            token = f"{worker_id}-{uuid.uuid4().hex[:8]}"
+            self.leased[job["id"]] = (token, job, time.time())
+            return Lease(dict(job), token)
+
+    def heartbeat(self, lease):
+        with self._lock:
+            entry = self.leased.get(lease.job["id"])
+            if entry is None or entry[0] != lease.token:
+                return False
+            self.leased[lease.job["id"]] = (entry[0], entry[1], time.time())
+            return True
+
+    def complete(self, lease, result, publish=None):
+        with self._lock:
+            entry = self.leased.get(lease.job["id"])
+            if entry is None or entry[0] != lease.token:
+                return False
+            del self.leased[lease.job["id"]]
+            if publish is not None:
+                result = publish(result)
+            self.done[lease.job["id"]] = dict(entry[1], result=result)
+            return True
+
+    def reap_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [i for i, (_, _, t) in self.leased.items() if now - t >= self.lease_seconds]
+            for job_id in expired:
+                _, job, _ = self.leased.pop(job_id)
+                job["attempts"] = job.get("attempts", 0) + 1
+                if job["attempts"] >= self.max_attempts:
+                    self.done[job_id] = dict(job, result=_abandoned_result(job))
+                else:
+                    self.pending.append(job)
+            self.pending.sort(key=lambda j: j.get("priority", 0))
+        return len(expired)
+
+    def counts(self):
+        with self._lock:
+            return {"pending": len(self.pending), "leased": len(self.leased), "done": len(self.done)}
+
+    def results(self):
+        with self._lock:
+            return list(self.done.values())
+
+
+def enqueue_directory(queue, input_dir, output_dir, method="advanced-gs", dpi=150, verify=None,
+                      run_id=None):
+    """
+    协调者: 枚举输入目录中的PDF并放入队列
+
+    任务按估算耗时从大到小排列 (LPT)，正在排队或处理中的文件不会重复入队，
+    已完成的文件会重新入队 (例如定期重新处理整个归档)。
+    队列空闲时，上一轮的结果会先被归档，done 中只保留本轮的结果。
+    输入和输出目录必须在所有机器上以相同路径挂载。
+
+    返回:
+    - 新入队的任务数
+    """
+    input_root = os.path.abspath(input_dir)
+    output_root = os.path.abspath(output_dir)
+    counts = queue.counts()
+    if counts["pending"] == 0 and counts["leased"] == 0:
+        queue.archive_done()
+    known = queue.known_ids()
+
+    jobs = []
+    for path in iter_pdf_files(input_root):
+        rel_path = os.path.relpath(path, input_root)
+        job_id = job_id_for(path, output_root)
+        if job_id in known:
+            continue
+        jobs.append({
+            "id": job_id,
+            "rel_path": rel_path,
+            "input": path,
+            "output": os.path.join(output_root, rel_path),
+            "method": method,
+            "dpi": dpi,
+            "verify": verify,
+            "size": os.path.getsize(path),
+            "run": run_id,
+        })
+
+    cost_model = CostModel.load(os.path.join(output_root, ".compress_stats.json"))
+    costs = [cost_model.estimate(job["size"], None, method) for job in jobs]
+    order, _ = lpt_schedule(costs, 1)
+    for priority, i in enumerate(order):
+        jobs[i]["priority"] = priority
+        queue.put(jobs[i])
+    return len(jobs)
+
+
+def _temp_output(lease):
+    """任务的临时输出路径，位于输出目录下，提交后原子替换，避免其他机器读到写了一半的结果"""
+    return f"{lease.job['output']}.{lease.token}.tmp"
+
+
+def _publish_output(lease, result):
+    """提交点之后把临时输出替换到输出路径"""
+    if not result["success"]:
+        return result
+    try:
+        os.replace(_temp_output(lease), lease.job["output"])
+    except OSError as e:
+        return dict(result, success=False, error=f"无法写入输出文件: {e}")
+    return result
+
+
+def run_job(queue, lease, heartbeat_interval):
+    """
+    在心跳线程的保护下执行一个任务，返回结果字典
+    输出写在临时文件中，由 queue.complete() 在提交点之后替换到输出路径
+    """
+    job = lease.job
+    lost = threading.Event()
+    finished = threading.Event()
+
+    def keep_alive():
+        # 未指定间隔时每次按队列当前的租约时长计算，协调者修改租约后立即生效
+        while not finished.wait(heartbeat_interval or queue.lease_seconds / 3):
+            if not queue.heartbeat(lease):
+                lost.set()
+                return
+
+    heartbeat_thread = threading.Thread(target=keep_alive, daemon=True)
+    heartbeat_thread.start()
+
+    start = time.monotonic()
+    try:
+        Path(job["output"]).parent.mkdir(parents=True, exist_ok=True)
+        success, compression_ratio = compress_pdf(
+            job["input"], _temp_output(lease), job["method"], job["dpi"], False, job.get("verify"))
+        error = None
+    except Exception as e:
+        success, compression_ratio, error = False, None, str(e)
+    finally:
+        finished.set()
+        heartbeat_thread.join()
+
+    return {
+        "success": success,
+        "compression_ratio": compression_ratio,
+        "error": error,
+        "worker": lease.token.rsplit("-", 1)[0],
+        "seconds": time.monotonic() - start,
+        "lease_lost": lost.is_set(),
+    }
+
+
+def run_worker(queue, worker_id=None, heartbeat_interval=None, idle_exit=False, poll_interval=5.0,
+               stop_event=None):
+    """
+    工作者循环: 领取任务、压缩、提交结果
+
+    参数:
+    - queue: LeaseDirQueue 或 MemoryQueue
+    - worker_id: 工作者标识 (默认: 主机名-进程号-线程号)
+    - heartbeat_interval: 心跳间隔 (默认: 队列租约时长的1/3)
+    - idle_exit: 队列为空时是否退出
+    - poll_interval: 队列为空时的等待间隔 (秒)
+    - stop_event: 可选的 threading.Event，设置后处理完当前任务即退出
+
+    返回:
+    - 本工作者完成的任务数
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    completed = 0
+
+    while stop_event is None or not stop_event.is_set():
+        lease = queue.claim(worker_id)
+        if lease is None:
+            # 空闲时顺便回收过期租约
+            if queue.reap_expired():
+                continue
+            if idle_exit:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        job = lease.job
+        logger.info(f"[{worker_id}] 开始处理: {job['rel_path']}")
+        result = run_job(queue, lease, heartbeat_interval)
+        committed = not result["lease_lost"] and queue.complete(
+            lease, result, lambda r: _publish_output(lease, r))
+        # 已发布的临时文件已被替换掉，剩下的是失败或被丢弃的结果
+        if os.path.exists(_temp_output(lease)):
+            os.remove(_temp_output(lease))
+        if not committed:
+            logger.warning(f"[{worker_id}] 租约已失效，丢弃结果: {job['rel_path']}")
+            continue
+        completed += 1
+        status = "成功" if result["success"] else "失败"
+        logger.info(f"[{worker_id}] {status}: {job['rel_path']} ({result['seconds']:.1f} 秒)")
+
+    return completed
+
+
+def monitor_queue(queue, run_id=None, poll_interval=10.0, verbose=True):
+    """
+    协调者: 等待所有任务完成，期间回收过期租约
+
+    参数:
+    - run_id: 只统计该批次的结果 (None表示统计 done 中的全部结果)
+
+    返回:
+    - 成功数
+    - 失败的相对路径列表
+    """
+    while True:
+        queue.reap_expired()
+        counts = queue.counts()
+        if verbose:
+            logger.info(f"等待: {counts['pending']}, 处理中: {counts['leased']}, 已完成: {counts['done']}")
+        if counts["pending"] == 0 and counts["leased"] == 0:
+            break
+        time.sleep(poll_interval)
+
+    success_count = 0
+    failed_files = []
+    for job in queue.results():
+        if run_id is not None and job.get("run") != run_id:
+            continue
+        if job["result"]["success"]:
+            success_count += 1
+        else:
+            failed_files.append(job["rel_path"])
+    return success_count, failed_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多机分布式PDF批量压缩")
+    subparsers = parser.add_subparsers(dest="role", required=True)
+
+    coordinator = subparsers.add_parser("coordinator", help="枚举PDF并放入队列，等待全部完成")
+    coordinator.add_argument("input", help="输入目录 (所有机器上路径相同)")
+    coordinator.add_argument("output", help="输出目录 (所有机器上路径相同)")
+    coordinator.add_argument(
+        "-m", "--method",
+        choices=["advanced-gs", "qpdf", "img2pdf", "ocrmypdf", "all"],
+        default="advanced-gs",
+        help="压缩方法 (默认: advanced-gs)"
+    )
+    coordinator.add_argument("--dpi", type=int, default=150, help="图像分辨率 (用于img2pdf方法，默认: 150)")
+    coordinator.add_argument(
+        "--verify", nargs="?", type=float, const=DEFAULT_THRESHOLD, metavar="THRESHOLD",
+        help=f"校验压缩结果，可指定相似度阈值 (默认: {DEFAULT_THRESHOLD})"
+    )
+    coordinator.add_argument("--no-wait", action="store_true", help="只入队，不等待完成")
+    coordinator.add_argument("--lease", type=float,
+                             help=f"租约时长 (秒)，写入队列配置供所有工作者使用 "
+                                  f"(默认: 沿用队列已有配置，新队列为 {DEFAULT_LEASE:.0f})")
+
+    worker = subparsers.add_parser("worker", help="领取并处理队列中的任务")
+    worker.add_argument("--threads", type=int, default=1, help="本机并行处理的任务数 (默认: 1)")
+    worker.add_argument("--idle-exit", action="store_true", help="队列为空时退出")
+    worker.add_argument("--scratch-root", help="临时文件根目录 (默认: /dev/shm，空间不足时改用磁盘临时目录)")
+    worker.add_argument("--scratch-quota", type=parse_size, help="单个文件可使用的scratch空间上限，例如 2G")
+
+    for sub in (coordinator, worker):
+        sub.add_argument("--queue", required=True, help="共享存储上的队列目录")
+
+    args = parser.parse_args()
+    # 只有协调者设置租约时长，工作者从队列配置中读取；
+    # 未指定 --lease 时不覆盖已有配置，以免缩短正在处理的任务的租约
+    queue = LeaseDirQueue(args.queue)
+
+    if args.role == "coordinator":
+        if args.lease is not None:
+            queue.configure(args.lease)
+        elif not queue.config_path.exists():
+            queue.configure(DEFAULT_LEASE)
+        if not os.path.isdir(args.input):
+            logger.error(f"错误: 输入目录不存在: {args.input}")
+            return
+        run_id = new_run_id()
+        count = enqueue_directory(queue, args.input, args.output, args.method, args.dpi, args.verify, run_id)
+        logger.info(f"已入队 {count} 个新任务 (批次 {run_id})")
+        if args.no_wait:
+            return
+        success_count, failed_files = monitor_queue(queue, run_id)
+        logger.info(f"\n压缩完成: {success_count} 个文件成功压缩")
+        if failed_files:
+            logger.warning("以下文件压缩失败:")
+            for f in failed_files:
+                logger.warning(f"  - {f}")
+    else:
+        configure_scratch(args.scratch_root, args.scratch_quota)
+        threads = [
+            threading.Thread(target=run_worker, args=(queue,), kwargs={"idle_exit": args.idle_exit})
+            for _ in range(args.threads)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+if __name__ == "__main__":
+    main()
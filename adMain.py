@@ -3,9 +3,14 @@ import argparse
 import subprocess
 import shutil
 from pathlib import Path
-import tempfile
 import logging
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from adSchedule import PAGE_COUNT_LIMIT, CostModel, count_pages, lpt_schedule
+from adScratch import configure_scratch, get_scratch, parse_size
+from adVerify import DEFAULT_THRESHOLD, verify_pdf
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -55,22 +60,28 @@ def compress_with_gs_high_quality(input_path, output_path):
     except FileNotFoundError:
         return False, "未找到Ghostscript，请确保已安装"
 
-def compress_with_qpdf(input_path, output_path):
+def compress_with_qpdf(input_path, output_path, scratch=None):
     """
     使用QPDF进行压缩
     QPDF是一个强大的PDF处理工具，对某些PDF特别有效
+    线性化的中间结果写入scratch空间，不修改输入文件
     """
+    if scratch is None:
+        with get_scratch().job() as scratch:
+            return compress_with_qpdf(input_path, output_path, scratch)
+    
+    linearized = scratch.file(".pdf", os.path.getsize(input_path))
     try:
         # 首先优化PDF结构
         subprocess.run(
-            ["qpdf", "--linearize", input_path, "--replace-input"],
+            ["qpdf", "--linearize", input_path, linearized],
             check=True, capture_output=True, text=True
         )
         
         # 然后进行压缩
         subprocess.run(
             [
-                "qpdf", input_path,
+                "qpdf", linearized,
                 "--object-streams=generate",
                 "--compression-level=9",  # 最大压缩级别
                 "--recompress-flate",
@@ -84,45 +95,59 @@ def compress_with_qpdf(input_path, output_path):
         return False, f"QPDF错误: {e.stderr}"
     except FileNotFoundError:
         return False, "未找到QPDF，请确保已安装"
+    finally:
+        scratch.release(linearized)
 
-def compress_with_img2pdf(input_path, output_path, dpi=150):
+def compress_with_img2pdf(input_path, output_path, dpi=150, scratch=None):
     """
     采用img2pdf策略 - 转换为图像后重新创建PDF
     对于一些特殊PDF非常有效，但可能会降低文本可选择性
+    页面图像写入scratch空间 (优先内存)，转换完成后立即删除
     """
+    if scratch is None:
+        with get_scratch().job() as scratch:
+            return compress_with_img2pdf(input_path, output_path, dpi, scratch)
+    
+    # 预估页面图像总大小 (按A4、RGB、PNG约2:1压缩)
+    pages = count_pages(input_path) or max(1, os.path.getsize(input_path) // (100 * 1024))
+    expected_size = int(pages * 8.27 * 11.69 * dpi * dpi * 3 / 2)
+    
+    # 创建临时目录
+    temp_dir = scratch.directory(expected_size)
     try:
-        # 创建临时目录
-        with tempfile.TemporaryDirectory() as temp_dir:
-            # 使用pdftoppm转换为图像
-            img_prefix = os.path.join(temp_dir, "page")
-            
-            # 转换PDF为图像
-            subprocess.run(
-                ["pdftoppm", "-png", "-r", str(dpi), input_path, img_prefix],
-                check=True, capture_output=True, text=True
-            )
-            
-            # 获取所有生成的PNG图像并排序
-            images = sorted([
-                os.path.join(temp_dir, f) for f in os.listdir(temp_dir)
-                if f.endswith(".png")
-            ])
-            
-            if not images:
-                return False, "转换为图像失败，未生成任何图像"
-            
-            # 使用img2pdf重新创建PDF (保持高质量，但文件大小更小)
-            subprocess.run(
-                ["img2pdf"] + images + ["-o", output_path],
-                check=True, capture_output=True, text=True
-            )
-            
-            return True, None
+        # 使用pdftoppm转换为图像
+        img_prefix = os.path.join(temp_dir, "page")
+        
+        # 转换PDF为图像
+        subprocess.run(
+            ["pdftoppm", "-png", "-r", str(dpi), input_path, img_prefix],
+            check=True, capture_output=True, text=True
+        )
+        
+        # 获取所有生成的PNG图像并排序
+        images = sorted([
+            os.path.join(temp_dir, f) for f in os.listdir(temp_dir)
+            if f.endswith(".png")
+        ])
+        
+        if not images:
+            return False, "转换为图像失败，未生成任何图像"
+        
+        # 使用img2pdf重新创建PDF (保持高质量，但文件大小更小)
+        subprocess.run(
+            ["img2pdf"] + images + ["-o", output_path],
+            check=True, capture_output=True, text=True
+        )
+        
+        return True, None
     except subprocess.CalledProcessError as e:
         return False, f"转换错误: {e.stderr}"
     except FileNotFoundError as e:
         tool = "pdftoppm" if "pdftoppm" in str(e) else "img2pdf"
         return False, f"未找到{tool}，请确保已安装"
+    finally:
+        # 页面图像只在转换期间需要，尽早归还scratch空间
+        scratch.release(temp_dir)
 
 def compress_with_ocrmypdf(input_path, output_path):
     """
@@ -148,7 +173,8 @@ def compress_with_ocrmypdf(input_path, output_path):
     except FileNotFoundError:
         return False, "未找到OCRmyPDF，请确保已安装"
 
-def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, verbose=True):
+def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, verbose=True,
+                 verify=None):
     """
     压缩PDF文件，使用多种方法
     
@@ -163,11 +189,18 @@ def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, ve
       - "all": 尝试所有方法，选择最佳结果
     - dpi: 图像分辨率 (适用于img2pdf方法)
     - verbose: 是否显示详细信息
+    - verify: 校验相似度阈值 (None表示不校验)，校验失败的结果不会被采用
     
     返回:
     - 成功与否
     - 压缩率信息
     """
+    # 所有中间文件放在同一个scratch任务中，无论成功、失败还是异常都会被清理
+    with get_scratch().job() as scratch:
+        return _compress_pdf(input_path, output_path, method, dpi, verbose, verify, scratch)
+
+def _compress_pdf(input_path, output_path, method, dpi, verbose, verify, scratch):
+    """compress_pdf 的实现，临时文件都从 scratch 中分配"""
     if not os.path.exists(input_path):
         logger.error(f"错误: 找不到文件 {input_path}")
         return False, None
@@ -179,8 +212,7 @@ def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, ve
     is_temp = False
     if output_path is None:
         is_temp = True
-        temp_fd, output_path = tempfile.mkstemp(suffix=".pdf")
-        os.close(temp_fd)
+        output_path = scratch.file(".pdf", original_size)
     
     # 用于存储所有压缩结果的列表 (用于"all"方法)
     results = []
@@ -191,14 +223,16 @@ def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, ve
         logger.info("尝试所有压缩方法，将选择最佳结果")
         
         for m in methods:
-            temp_output = tempfile.mktemp(suffix=".pdf")
-            success, error = compress_with_method(input_path, temp_output, m, dpi)
+            temp_output = scratch.file(".pdf", original_size)
+            success, error, temp_output = _compress_in_scratch(
+                input_path, temp_output, m, dpi, scratch, original_size)
             
             if success:
                 size = os.path.getsize(temp_output)
                 results.append((m, temp_output, size))
                 logger.info(f"方法 {m} 成功: {size/1024:.2f} KB")
             else:
+                scratch.release(temp_output)
                 logger.warning(f"方法 {m} 失败: {error}")
         
         # 如果没有成功的方法，返回失败
@@ -206,27 +240,71 @@ def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, ve
             logger.error("所有压缩方法均失败")
             return False, None
         
-        # 选择文件大小最小的结果
-        best_method, best_output, best_size = min(results, key=lambda x: x[2])
-        logger.info(f"最佳方法: {best_method}，大小: {best_size/1024:.2f} KB")
+        # 按文件大小从小到大选择，校验失败时依次尝试下一个
+        best = None
+        for m, temp_output, size in sorted(results, key=lambda x: x[2]):
+            if verify is not None:
+                if size >= original_size:
+                    # 剩余结果都不比原始文件小，不会被采用，也不复制到输出路径
+                    logger.warning("压缩未能减小文件大小，保持原始文件")
+                    break
+                passed, _, error = verify_pdf(input_path, temp_output, verify)
+                if not passed:
+                    logger.warning(f"方法 {m} 校验失败: {error}")
+                    continue
+            best = (m, temp_output, size)
+            break
         
-        # 移动到目标位置
-        shutil.copy2(best_output, output_path)
+        if best is not None:
+            best_method, best_output, best_size = best
+            logger.info(f"最佳方法: {best_method}，大小: {best_size/1024:.2f} KB")
+            
+            # 移动到目标位置
+            shutil.copy2(best_output, output_path)
         
         # 清理临时文件
         for _, temp_file, _ in results:
-            try:
-                os.remove(temp_file)
-            except:
-                pass
+            scratch.release(temp_file)
+        
+        if best is None:
+            logger.error("没有既小于原始文件又通过校验的压缩结果")
+            if is_temp:
+                os.remove(output_path)
+            return False, None
     else:
         # 使用单一方法
-        success, error = compress_with_method(input_path, output_path, method, dpi)
+        # 开启校验时先写入scratch，通过后再复制到输出路径，被拒绝的结果不会留在输出目录
+        candidate = scratch.file(".pdf", original_size) if verify is not None else output_path
+        success, error, candidate = _compress_in_scratch(
+            input_path, candidate, method, dpi, scratch, original_size)
+        if verify is None:
+            # 未开启校验时candidate就是输出路径，重试时可能已移到磁盘
+            output_path = candidate
         if not success:
             logger.error(f"压缩失败: {error}")
             if is_temp:
                 os.remove(output_path)
             return False, None
+        
+        if verify is not None:
+            # 只有比原始文件小且通过校验的结果才会复制到输出路径
+            if os.path.getsize(candidate) >= original_size:
+                logger.warning("压缩未能减小文件大小，保持原始文件")
+                scratch.release(candidate)
+                if is_temp:
+                    os.remove(output_path)
+                return False, None
+            passed, score, error = verify_pdf(input_path, candidate, verify)
+            if not passed:
+                logger.error(f"压缩结果校验失败: {error}")
+                scratch.release(candidate)
+                if is_temp:
+                    os.remove(output_path)
+                return False, None
+            if verbose and score is not None:
+                logger.info(f"校验通过，最低页面相似度: {score:.3f}")
+            shutil.copy2(candidate, output_path)
+            scratch.release(candidate)
     
     # 获取压缩后的文件大小
     compressed_size = os.path.getsize(output_path)
@@ -252,29 +330,71 @@ def compress_pdf(input_path, output_path=None, method="advanced-gs", dpi=150, ve
     
     return True, compression_ratio
 
-def compress_with_method(input_path, output_path, method, dpi):
+def compress_with_method(input_path, output_path, method, dpi, scratch=None):
     """根据指定的方法压缩PDF"""
     if method == "advanced-gs":
         return compress_with_gs_high_quality(input_path, output_path)
     elif method == "qpdf":
-        return compress_with_qpdf(input_path, output_path)
+        return compress_with_qpdf(input_path, output_path, scratch)
     elif method == "img2pdf":
-        return compress_with_img2pdf(input_path, output_path, dpi)
+        return compress_with_img2pdf(input_path, output_path, dpi, scratch)
     elif method == "ocrmypdf":
         return compress_with_ocrmypdf(input_path, output_path)
     else:
         return False, f"未知的压缩方法: {method}"
 
-def process_directory(input_dir, output_dir, method="advanced-gs", dpi=150, verbose=True):
+def _compress_in_scratch(input_path, output_path, method, dpi, scratch, expected_size):
+    """
+    执行压缩，scratch的内存空间在写入过程中被写满时改用磁盘重试一次
+    
+    返回:
+    - 成功与否
+    - 错误信息
+    - 实际的输出路径 (重试时输出会改到磁盘上的新临时文件)
+    """
+    # 只关心本次尝试期间是否写满 ("all" 模式下同一任务会依次尝试多种方法)
+    scratch.ram_full = False
+    success, error = compress_with_method(input_path, output_path, method, dpi, scratch)
+    if success or not scratch.ran_out_of_space(error):
+        return success, error, output_path
+    
+    logger.warning(f"方法 {method} 失败时scratch内存空间不足，改用磁盘重试")
+    scratch.force_disk = True
+    if scratch.in_ram(output_path):
+        scratch.release(output_path)
+        output_path = scratch.file(".pdf", expected_size)
+    success, error = compress_with_method(input_path, output_path, method, dpi, scratch)
+    return success, error, output_path
+
+def _timed_compress(input_path, output_path, method, dpi, verbose, verify=None, pages=None):
+    """
+    执行压缩并返回耗时 (供进程池调用)
+    调度时未读取页数的文件在这里读取 (不计入耗时)，供耗时模型使用
+    """
+    start = time.monotonic()
+    success, compression_ratio = compress_pdf(input_path, output_path, method, dpi, verbose, verify)
+    elapsed = time.monotonic() - start
+    if success and pages is None:
+        pages = count_pages(input_path)
+    return success, compression_ratio, elapsed, pages
+
+def process_directory(input_dir, output_dir, method="advanced-gs", dpi=150, verbose=True,
+                      workers=1, stats_file=None, verify=None):
     """
     处理整个目录的PDF文件
     
+    文件按估算耗时从大到小排序后提交 (LPT)，大文件先开始，避免最后一个大文件
+    让其他工作进程空等。估算模型根据每次运行的实际耗时更新。
+    
     参数:
     - input_dir: 输入目录路径
     - output_dir: 输出目录路径
     - method: 压缩方法
     - dpi: 图像分辨率 (用于img2pdf方法)
     - verbose: 是否显示详细信息
+    - workers: 并行压缩进程数 (默认: 1)
+    - stats_file: 耗时统计文件路径 (默认: 输出目录下的 .compress_stats.json)
+    - verify: 校验相似度阈值 (None表示不校验)
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
@@ -295,33 +415,88 @@ def process_directory(input_dir, output_dir, method="advanced-gs", dpi=150, verb
     if verbose:
         logger.info(f"找到 {total_files} 个PDF文件需要处理")
     
-    for i, pdf_file in enumerate(pdf_files, 1):
+    # 估算每个文件的耗时，按LPT顺序排列
+    if stats_file is None:
+        stats_file = os.path.join(output_dir, ".compress_stats.json")
+    cost_model = CostModel.load(stats_file)
+    sizes = [os.path.getsize(f) for f in pdf_files]
+    if total_files <= PAGE_COUNT_LIMIT:
+        pages = [count_pages(str(f)) for f in pdf_files]
+    else:
+        # 文件太多时只按大小排序，页数由各工作进程并行读取
+        pages = [None] * total_files
+    costs = [cost_model.estimate(sizes[i], pages[i], method) for i in range(total_files)]
+    order, predicted = lpt_schedule(costs, workers)
+    
+    if verbose:
+        logger.info(f"使用 {workers} 个工作进程，预计耗时: {predicted:.1f} 秒")
+    
+    jobs = []
+    for i in order:
+        pdf_file = pdf_files[i]
         # 保持相对路径结构
         rel_path = pdf_file.relative_to(input_dir_path)
         output_path = Path(output_dir) / rel_path
         
         # 确保输出目录存在
         output_path.parent.mkdir(parents=True, exist_ok=True)
+        jobs.append((i, rel_path, output_path))
+    
+    def handle_result(n, i, rel_path, output_path, result):
+        nonlocal success_count, total_saved
+        success, compression_ratio, elapsed, page_count = result
+        # 失败的运行 (缺少工具、进程异常等) 耗时不具代表性，不用于修正估算
+        if success:
+            cost_model.record(sizes[i], page_count, method, elapsed)
         
         if verbose:
-            logger.info(f"\n处理 [{i}/{total_files}]: {rel_path}")
-        
-        success, compression_ratio = compress_pdf(
-            str(pdf_file), str(output_path), method, dpi, verbose)
+            logger.info(f"完成 [{n}/{total_files}]: {rel_path} "
+                        f"(预计 {costs[i]:.1f} 秒, 实际 {elapsed:.1f} 秒)")
         
         if success:
             success_count += 1
             if compression_ratio:
-                original_size = os.path.getsize(pdf_file) / 1024
+                original_size = sizes[i] / 1024
                 compressed_size = os.path.getsize(output_path) / 1024
                 saved_kb = original_size - compressed_size
                 total_saved += saved_kb
         else:
             failed_files.append(str(rel_path))
     
+    start = time.monotonic()
+    if workers <= 1:
+        for n, (i, rel_path, output_path) in enumerate(jobs, 1):
+            if verbose:
+                logger.info(f"\n处理 [{n}/{total_files}]: {rel_path}")
+            result = _timed_compress(str(pdf_files[i]), str(output_path), method, dpi, verbose, verify, pages[i])
+            handle_result(n, i, rel_path, output_path, result)
+    else:
+        # 进程池按提交顺序取任务，空闲进程总是领取剩余最大的任务
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_timed_compress, str(pdf_files[i]), str(output_path),
+                            method, dpi, verbose, verify, pages[i]): (i, rel_path, output_path)
+                for i, rel_path, output_path in jobs
+            }
+            for n, future in enumerate(as_completed(futures), 1):
+                i, rel_path, output_path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"压缩进程异常 {rel_path}: {e}")
+                    result = (False, None, 0.0, None)
+                handle_result(n, i, rel_path, output_path, result)
+    actual = time.monotonic() - start
+    
+    try:
+        cost_model.save(stats_file)
+    except OSError as e:
+        logger.warning(f"无法保存耗时统计文件 {stats_file}: {e}")
+    
     if verbose:
         logger.info(f"\n压缩完成: {success_count}/{total_files} 文件成功压缩")
         logger.info(f"总共节省: {total_saved:.2f} KB")
+        logger.info(f"预计耗时: {predicted:.1f} 秒, 实际耗时: {actual:.1f} 秒")
         
         if failed_files:
             logger.warning("以下文件压缩失败:")
@@ -344,6 +519,14 @@ def main():
     )
     parser.add_argument("--silent", action="store_true", help="静默模式，不显示详细信息")
     parser.add_argument("--batch", action="store_true", help="批处理模式，处理整个目录")
+    parser.add_argument("--workers", type=int, default=1, help="批处理模式下的并行进程数 (默认: 1)")
+    parser.add_argument(
+        "--verify", nargs="?", type=float, const=DEFAULT_THRESHOLD, metavar="THRESHOLD",
+        help=f"校验压缩结果 (页数和抽样页面相似度)，可指定相似度阈值 (默认: {DEFAULT_THRESHOLD})"
+    )
+    parser.add_argument("--scratch-root", help="临时文件根目录 (默认: /dev/shm，空间不足时改用磁盘临时目录)")
+    parser.add_argument("--scratch-quota", type=parse_size, help="单个文件可使用的scratch空间上限，例如 2G")
+    parser.add_argument("--stats-file", help="耗时统计文件路径 (默认: 输出目录下的 .compress_stats.json)")
     
     args = parser.parse_args()
     
@@ -351,15 +534,18 @@ def main():
     if args.silent:
         logger.setLevel(logging.WARNING)
     
+    configure_scratch(args.scratch_root, args.scratch_quota)
+    
     # 批处理模式，处理整个目录
     if args.batch or os.path.isdir(args.input):
         if not args.output:
             logger.error("错误: 批处理模式下必须指定输出目录")
             return
-        process_directory(args.input, args.output, args.method, args.dpi, not args.silent)
+        process_directory(args.input, args.output, args.method, args.dpi, not args.silent,
+                          workers=args.workers, stats_file=args.stats_file, verify=args.verify)
     else:
         # 单文件模式
-        compress_pdf(args.input, args.output, args.method, args.dpi, not args.silent)
+        compress_pdf(args.input, args.output, args.method, args.dpi, not args.silent, args.verify)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
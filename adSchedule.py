@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+批处理任务调度 - 按估算耗时排序并进行最长处理时间优先 (LPT) 分配
+
+耗时估算模型: 耗时 ≈ a × 文件大小(MB) + b × 页数
+每种压缩方法各有一组系数 (a, b)，初始为经验值，之后根据历史运行的实际耗时
+用带先验的最小二乘不断修正，并保存在统计文件中供下次使用。
+"""
+
+import os
+import json
+import heapq
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from pikepdf import Pdf
+except ImportError:
+    Pdf = None
+
+# 各方法的初始系数: (每MB秒数, 每页秒数)
+DEFAULT_COEFFICIENTS = {
+    "advanced-gs": (0.5, 0.05),
+    "qpdf": (0.1, 0.005),
+    "img2pdf": (0.3, 0.4),
+    "ocrmypdf": (0.5, 2.0),
+}
+DEFAULT_COEFFICIENTS["all"] = tuple(
+    sum(c[i] for c in DEFAULT_COEFFICIENTS.values()) for i in range(2))
+
+# 先验的权重，相当于多少个"虚拟样本"
+PRIOR_WEIGHT = 5.0
+# 无法读取页数时按此密度估算
+DEFAULT_PAGES_PER_MB = 10.0
+# 文件数超过此值时调度前不逐个打开PDF读取页数 (串行开销太大)，只按大小估算，
+# 页数改由工作进程在压缩后读取，用于修正模型
+PAGE_COUNT_LIMIT = 200
+
+
+def count_pages(path):
+    """读取PDF页数，无法读取时返回None"""
+    if Pdf is None:
+        return None
+    try:
+        with Pdf.open(path) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+
+class CostModel:
+    """按压缩方法学习耗时系数的线性模型"""
+
+    def __init__(self, stats=None):
+        # 每种方法保存最小二乘的累计量: sxx (2x2), sxt (2), n
+        self.stats = stats or {}
+
+    @classmethod
+    def load(cls, path):
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return cls(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法读取耗时统计文件 {path}: {e}")
+        return cls()
+
+    def save(self, path):
+        if not path:
+            return
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.stats, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _method_stats(self, method):
+        return self.stats.setdefault(method, {
+            "sxx": [[0.0, 0.0], [0.0, 0.0]], "sxt": [0.0, 0.0], "n": 0,
+            "pages": 0.0, "mb": 0.0,
+        })
+
+    def pages_per_mb(self, method):
+        s = self.stats.get(method)
+        if s and s["mb"] > 0 and s["pages"] > 0:
+            return s["pages"] / s["mb"]
+        return DEFAULT_PAGES_PER_MB
+
+    def coefficients(self, method):
+        """求解带先验的最小二乘: (Sxx + λI) w = Sxt + λ w0"""
+        prior = DEFAULT_COEFFICIENTS.get(method, DEFAULT_COEFFICIENTS["advanced-gs"])
+        s = self.stats.get(method)
+        if not s or s["n"] == 0:
+            return prior
+        a11 = s["sxx"][0][0] + PRIOR_WEIGHT
+        a12 = s["sxx"][0][1]
+        a22 = s["sxx"][1][1] + PRIOR_WEIGHT
+        b1 = s["sxt"][0] + PRIOR_WEIGHT * prior[0]
+        b2 = s["sxt"][1] + PRIOR_WEIGHT * prior[1]
+        det = a11 * a22 - a12 * a12
+        if det <= 0:
+            return prior
+        w1 = (b1 * a22 - b2 * a12) / det
+        w2 = (a11 * b2 - a12 * b1) / det
+        return max(w1, 0.0), max(w2, 0.0)
+
+    def features(self, size, pages, method):
+        mb = size / (1024 * 1024)
+        if pages is None:
+            pages = mb * self.pages_per_mb(method)
+        return mb, pages
+
+    def estimate(self, size, pages, method):
+        """估算压缩耗时 (秒)"""
+        mb, pages = self.features(size, pages, method)
+        a, b = self.coefficients(method)
+        return a * mb + b * pages
+
+    def record(self, size, pages, method, seconds):
+        """记录一次实际耗时"""
+        s = self._method_stats(method)
+        mb, est_pages = self.features(size, pages, method)
+        s["sxx"][0][0] += mb * mb
+        s["sxx"][0][1] += mb * est_pages
+        s["sxx"][1][0] += mb * est_pages
+        s["sxx"][1][1] += est_pages * est_pages
+        s["sxt"][0] += mb * seconds
+        s["sxt"][1] += est_pages * seconds
+        s["n"] += 1
+        if pages is not None:
+            s["pages"] += pages
+            s["mb"] += mb
+
+
+def lpt_schedule(costs, workers):
+    """
+    最长处理时间优先 (LPT) 分配
+
+    参数:
+    - costs: 各任务的估算耗时
+    - workers: 工作进程数
+
+    返回:
+    - 按耗时从大到小排列的任务索引
+    - 预测的总完成时间 (makespan)
+    """
+    order = sorted(range(len(costs)), key=lambda i: costs[i], reverse=True)
+    loads = [0.0] * max(workers, 1)
+    heapq.heapify(loads)
+    for i in order:
+        # 每个任务分配给当前负载最小的工作进程
+        heapq.heappush(loads, heapq.heappop(loads) + costs[i])
+    return order, max(loads) if costs else 0.0
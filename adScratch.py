@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+临时文件 (scratch) 空间管理
+
+- 优先使用 scratch 根目录 (默认为内存文件系统 /dev/shm)，空闲空间不足或超出单个任务的配额时
+  自动改用磁盘临时目录
+- 每个任务在 scratch 根目录下有独立的子目录，按预计大小记账
+- 任务结束 (包括异常) 时删除全部临时文件；收到 SIGTERM/SIGHUP 或进程退出时也会清理
+- 任务目录名中记录所属主机和进程号，进程被 SIGKILL 或 OOM killer 杀死后遗留的目录
+  会在下次创建 ScratchManager 时删除
+
+配置可通过 configure_scratch() 或环境变量设置，环境变量会被子进程继承:
+- PDF_SCRATCH_ROOT: scratch 根目录 (默认: /dev/shm)
+- PDF_SCRATCH_QUOTA: 单个任务可使用的内存空间上限 (字节)
+"""
+
+import os
+import errno
+import shutil
+import signal
+import socket
+import atexit
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+RAM_ROOT = "/dev/shm"
+# 内存文件系统至少保留的空闲空间
+MIN_FREE = 256 * 1024 * 1024
+JOB_PREFIX = "express-pdf-"
+
+_active_jobs = set()
+_jobs_lock = threading.Lock()
+_atexit_registered = False
+_handlers_installed = False
+_default_manager = None
+
+
+def _cleanup_active_jobs():
+    with _jobs_lock:
+        # fork出的子进程会继承父进程的任务列表，只清理本进程创建的任务
+        jobs = [job for job in _active_jobs if job.pid == os.getpid()]
+    for job in jobs:
+        job.cleanup()
+
+
+def _signal_handler(signum, frame):
+    """清理临时文件后按默认方式重新发送信号"""
+    _cleanup_active_jobs()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def _install_handlers():
+    """注册退出清理和SIGTERM/SIGHUP处理函数 (信号处理函数只能在主线程中设置)"""
+    global _atexit_registered, _handlers_installed
+    if not _atexit_registered:
+        atexit.register(_cleanup_active_jobs)
+        _atexit_registered = True
+    if _handlers_installed or threading.current_thread() is not threading.main_thread():
+        return
+    for signum in (signal.SIGTERM, getattr(signal, "SIGHUP", None)):
+        if signum is None or signal.getsignal(signum) not in (signal.SIG_DFL, None):
+            continue
+        signal.signal(signum, _signal_handler)
+    _handlers_installed = True
+
+
+class ScratchJob:
+    """单个任务的临时空间，作为上下文管理器使用，退出时删除所有临时文件"""
+
+    def __init__(self, manager, quota=None):
+        self.manager = manager
+        self.quota = quota
+        self.ram_used = 0
+        self.reserved = {}   # 路径 -> (是否在首选根目录中, 预计大小)
+        self.dirs = {}       # 根目录 -> 本任务的子目录
+        self.pid = os.getpid()
+        # 首选根目录在写入过程中被写满后置为True，之后的分配都使用磁盘
+        self.force_disk = False
+        # 释放内存中的临时文件时发现首选根目录已满则置为True，
+        # 压缩方法通常在返回前就释放了中间文件，之后再检查空闲空间已经晚了
+        self.ram_full = False
+
+    def __enter__(self):
+        with _jobs_lock:
+            _active_jobs.add(self)
+        _install_handlers()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cleanup()
+        return False
+
+    def _choose_root(self, expected_size):
+        """首选根目录有足够空间且未超出配额时使用它，否则使用磁盘"""
+        ram_root = self.manager.ram_root
+        if ram_root is not None and not self.force_disk:
+            within_quota = self.quota is None or self.ram_used + expected_size <= self.quota
+            if within_quota and self.manager.ram_free() - expected_size >= self.manager.min_free:
+                return ram_root, True
+        return self.manager.disk_root, False
+
+    def _job_dir(self, root):
+        if root not in self.dirs:
+            prefix = f"{JOB_PREFIX}{socket.gethostname()}-{self.pid}-"
+            self.dirs[root] = tempfile.mkdtemp(prefix=prefix, dir=root)
+        return self.dirs[root]
+
+    def _reserve(self, path, in_ram, expected_size):
+        self.reserved[path] = (in_ram, expected_size)
+        if in_ram:
+            self.ram_used += expected_size
+
+    def file(self, suffix="", expected_size=0):
+        """分配一个临时文件路径 (文件已创建为空文件)"""
+        root, in_ram = self._choose_root(expected_size)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self._job_dir(root))
+        os.close(fd)
+        self._reserve(path, in_ram, expected_size)
+        return path
+
+    def directory(self, expected_size=0):
+        """分配一个临时目录"""
+        root, in_ram = self._choose_root(expected_size)
+        path = tempfile.mkdtemp(dir=self._job_dir(root))
+        self._reserve(path, in_ram, expected_size)
+        return path
+
+    def in_ram(self, path):
+        return self.reserved.get(path, (False, 0))[0]
+
+    def ran_out_of_space(self, error):
+        """
+        判断一次失败是否由首选根目录写满导致:
+        错误信息包含ENOSPC，或本任务使用过首选根目录且其空闲空间已低于保留值
+        (包括在失败前释放中间文件时记录下的情况)
+        """
+        ram_root = self.manager.ram_root
+        if ram_root is None or self.force_disk or ram_root not in self.dirs:
+            return False
+        if self.ram_full or (error and os.strerror(errno.ENOSPC) in str(error)):
+            return True
+        return self.manager.ram_free() < self.manager.min_free
+
+    def release(self, path):
+        """提前删除临时文件或目录并归还配额"""
+        in_ram, size = self.reserved.pop(path, (False, 0))
+        if in_ram:
+            self.ram_used -= size
+            if self.manager.ram_free() < self.manager.min_free:
+                self.ram_full = True
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """删除本任务的所有临时文件"""
+        for job_dir in self.dirs.values():
+            shutil.rmtree(job_dir, ignore_errors=True)
+        self.dirs.clear()
+        self.reserved.clear()
+        self.ram_used = 0
+        with _jobs_lock:
+            _active_jobs.discard(self)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # 例如 EPERM: 进程存在但属于其他用户
+        return True
+    return True
+
+
+def sweep_stale_jobs(root):
+    """
+    删除 root 下所属进程已不存在的任务目录 (进程被 SIGKILL 等无法捕获的信号杀死时遗留)
+    只处理本机创建的目录，共享 /dev/shm 的其他主机或容器的目录不受影响
+
+    返回:
+    - 删除的目录数
+    """
+    hostname = socket.gethostname()
+    removed = 0
+    try:
+        entries = os.listdir(root)
+    except OSError:
+        return 0
+    for name in entries:
+        if not name.startswith(JOB_PREFIX):
+            continue
+        # 目录名格式: <前缀><主机名>-<进程号>-<随机后缀>，主机名中可能含有 "-"
+        parts = name[len(JOB_PREFIX):].rsplit("-", 2)
+        if len(parts) != 3 or parts[0] != hostname or not parts[1].isdigit():
+            continue
+        if _pid_alive(int(parts[1])):
+            continue
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        removed += 1
+    if removed:
+        logger.info(f"已删除 {root} 中 {removed} 个遗留的临时目录")
+    return removed
+
+
+class ScratchManager:
+    """
+    scratch 空间管理器
+
+    参数:
+    - root: 首选的 scratch 根目录 (默认: /dev/shm)，空间不足时改用磁盘临时目录
+    - prefer_ram: 未指定 root 时是否使用 /dev/shm，为False时直接使用磁盘临时目录
+    - quota: 单个任务在首选根目录中可使用的空间上限 (字节)，None表示不限
+    - min_free: 内存文件系统至少保留的空闲空间 (字节)
+    """
+
+    def __init__(self, root=None, prefer_ram=True, quota=None, min_free=MIN_FREE):
+        self.quota = quota
+        self.min_free = min_free
+        self.disk_root = tempfile.gettempdir()
+        self.ram_root = None
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+            self.ram_root = root
+        elif prefer_ram and os.path.isdir(RAM_ROOT) and os.access(RAM_ROOT, os.W_OK):
+            self.ram_root = RAM_ROOT
+        for scratch_root in {self.ram_root, self.disk_root} - {None}:
+            sweep_stale_jobs(scratch_root)
+
+    def ram_free(self):
+        try:
+            return shutil.disk_usage(self.ram_root).free
+        except OSError:
+            return 0
+
+    def job(self, quota=None):
+        """创建一个任务的临时空间"""
+        return ScratchJob(self, quota if quota is not None else self.quota)
+
+
+def configure_scratch(root=None, quota=None):
+    """
+    设置默认的scratch配置 (同时写入环境变量，供子进程使用)
+    应在主线程中调用，以便安装信号处理函数；之后在工作线程中创建的任务也能在收到信号时被清理
+    """
+    global _default_manager
+    _install_handlers()
+    if root:
+        os.environ["PDF_SCRATCH_ROOT"] = root
+    if quota is not None:
+        os.environ["PDF_SCRATCH_QUOTA"] = str(quota)
+    _default_manager = None
+
+
+def get_scratch():
+    """获取默认的scratch管理器"""
+    global _default_manager
+    if _default_manager is None:
+        root = os.environ.get("PDF_SCRATCH_ROOT") or None
+        quota = os.environ.get("PDF_SCRATCH_QUOTA")
+        _default_manager = ScratchManager(root=root, quota=int(quota) if quota else None)
+    return _default_manager
+
+
+def parse_size(text):
+    """解析带单位的大小，例如 512M、2G"""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
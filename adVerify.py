@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+压缩结果校验 - 检查页数并抽样比对页面图像
+
+步骤:
+1. 用 pdfinfo 比较输入和输出的页数
+2. 均匀抽取若干页，用 pdftoppm 以很小的固定尺寸渲染为灰度图
+3. 用NumPy计算每对页面的相似度，取最低分与阈值比较
+
+渲染尺寸很小且只抽几页，开销只占压缩耗时的很小一部分，可以在生产中常开。
+"""
+
+import os
+import re
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from adScratch import get_scratch
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_SAMPLES = 3
+# 渲染尺寸 (宽, 高)，输入和输出使用相同尺寸便于逐像素比较
+RENDER_SIZE = (120, 160)
+# 标准差低于此值视为空白页
+BLANK_STD = 2.0
+
+
+def get_page_count(pdf_path):
+    """使用pdfinfo读取页数"""
+    result = subprocess.run(["pdfinfo", pdf_path], check=True, capture_output=True, text=True)
+    match = re.search(r"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    if not match:
+        raise ValueError(f"无法从pdfinfo输出中读取页数: {pdf_path}")
+    return int(match.group(1))
+
+
+def sample_pages(page_count, samples=DEFAULT_SAMPLES):
+    """均匀抽取页码 (从1开始)，总是包含首页和末页"""
+    if page_count <= samples:
+        return list(range(1, page_count + 1))
+    return sorted({int(round(p)) for p in np.linspace(1, page_count, samples)})
+
+
+def read_pgm(path):
+    """读取pdftoppm生成的二进制PGM (P5) 灰度图"""
+    with open(path, "rb") as f:
+        data = f.read()
+    # 头部: P5 <宽> <高> <最大值>，以空白分隔
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        start = pos
+        while not data[pos:pos + 1].isspace():
+            pos += 1
+        fields.append(data[start:pos])
+    width, height = int(fields[1]), int(fields[2])
+    return np.frombuffer(data, dtype=np.uint8, count=width * height, offset=pos + 1).reshape(height, width)
+
+
+def render_page(pdf_path, page, temp_dir, tag):
+    """将指定页渲染为小尺寸灰度图"""
+    prefix = os.path.join(temp_dir, f"{tag}-{page}")
+    subprocess.run(
+        [
+            "pdftoppm", "-gray", "-singlefile",
+            "-f", str(page), "-l", str(page),
+            "-scale-to-x", str(RENDER_SIZE[0]), "-scale-to-y", str(RENDER_SIZE[1]),
+            pdf_path, prefix
+        ],
+        check=True, capture_output=True, text=True
+    )
+    return read_pgm(prefix + ".pgm")
+
+
+def page_similarity(original, candidate):
+    """
+    计算两页图像的相似度 (0~1)
+    - 两页都是空白页: 按平均亮度差计算
+    - 只有一页空白: 0 (典型的空白页故障)
+    - 其他情况: 像素的皮尔逊相关系数
+    """
+    a = original.astype(np.float32).ravel()
+    b = candidate.astype(np.float32).ravel()
+    a_std, b_std = a.std(), b.std()
+    if a_std < BLANK_STD and b_std < BLANK_STD:
+        return float(1.0 - abs(a.mean() - b.mean()) / 255.0)
+    if a_std < BLANK_STD or b_std < BLANK_STD:
+        return 0.0
+    corr = np.dot(a - a.mean(), b - b.mean()) / (a.size * a_std * b_std)
+    return float(max(corr, 0.0))
+
+
+def verify_pdf(original_path, candidate_path, threshold=DEFAULT_THRESHOLD, samples=DEFAULT_SAMPLES):
+    """
+    校验压缩结果
+
+    参数:
+    - original_path: 原始PDF路径
+    - candidate_path: 压缩后的PDF路径
+    - threshold: 相似度阈值，低于此值视为损坏
+    - samples: 抽样页数
+
+    返回:
+    - 是否通过
+    - 最低相似度 (未进行图像比对时为None)
+    - 错误信息
+    """
+    try:
+        original_pages = get_page_count(original_path)
+        candidate_pages = get_page_count(candidate_path)
+    except subprocess.CalledProcessError as e:
+        return False, None, f"读取页数失败: {e.stderr}"
+    except FileNotFoundError:
+        return False, None, "未找到pdfinfo，请确保已安装poppler-utils"
+    except ValueError as e:
+        return False, None, str(e)
+
+    if original_pages != candidate_pages:
+        return False, None, f"页数不一致: 原始 {original_pages} 页, 压缩后 {candidate_pages} 页"
+
+    if np is None:
+        logger.warning("未安装NumPy，仅校验页数")
+        return True, None, None
+
+    pages = sample_pages(original_pages, samples)
+    if not pages:
+        return True, None, None
+    try:
+        with get_scratch().job() as scratch:
+            temp_dir = scratch.directory(len(pages) * 2 * RENDER_SIZE[0] * RENDER_SIZE[1])
+            # 渲染是外部进程，用线程并行即可
+            with ThreadPoolExecutor(max_workers=len(pages) * 2) as pool:
+                originals = [pool.submit(render_page, original_path, p, temp_dir, "a") for p in pages]
+                candidates = [pool.submit(render_page, candidate_path, p, temp_dir, "b") for p in pages]
+                scores = [page_similarity(a.result(), b.result()) for a, b in zip(originals, candidates)]
+    except subprocess.CalledProcessError as e:
+        return False, None, f"页面渲染失败: {e.stderr}"
+    except FileNotFoundError:
+        return False, None, "未找到pdftoppm，请确保已安装poppler-utils"
+
+    score = min(scores)
+    if score < threshold:
+        worst = pages[scores.index(score)]
+        return False, score, f"第 {worst} 页相似度 {score:.3f} 低于阈值 {threshold}"
+    return True, score, None
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+监视目录模式 - 持续监听输入目录中新增或修改的PDF文件并自动压缩
+
+与 process_directory 的一次性扫描不同，监视模式只在启动时遍历一次目录树，
+之后依靠 inotify 事件（Linux）或轮询（其他平台 / inotify 不可用时）发现变化。
+文件在写入稳定（大小和修改时间在 settle 秒内不再变化）后才会被送入压缩进程池，
+进程池满时暂停提交（背压），从放入文件到得到压缩结果只需数秒。
+
+使用方法: python adWatch.py 输入目录 输出目录 [-m 压缩方法] [--dpi DPI]
+"""
+
+import os
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from adMain import compress_pdf
+from adScratch import configure_scratch, parse_size
+from adVerify import DEFAULT_THRESHOLD
+
+# 配置日志
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# inotify 常量 (见 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF | IN_MOVE_SELF
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_pdf(name):
+    """判断文件名是否为需要处理的PDF (忽略隐藏文件和临时文件)"""
+    return name.lower().endswith(".pdf") and not name.startswith(".")
+
+
+def iter_pdf_files(root, exclude=None):
+    """
+    使用 os.scandir 递归遍历目录，产出所有PDF文件路径
+    比 Path.glob("**/*.pdf") 少一次 stat，适合深层大目录
+    """
+    stack = [str(root)]
+    while stack:
+        current = stack.pop()
+        if exclude and current == exclude:
+            continue
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file() and is_pdf(entry.name):
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"无法读取目录 {current}: {e}")
+
+
+def file_signature(path):
+    """返回文件的 (大小, 修改时间) 签名，文件不存在时返回None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class PollingWatcher:
+    """轮询监视器 - 定期遍历目录并比较文件签名，作为inotify不可用时的后备方案"""
+
+    # 轮询不受系统资源上限影响，无需切换
+    exhausted = False
+
+    def __init__(self, root, interval=5.0, exclude=None):
+        self.root = str(root)
+        self.interval = interval
+        self.exclude = exclude
+        self.snapshot = self._scan()
+        self.last_scan = time.monotonic()
+        # 启动时已存在的文件，供调用方复用，避免再遍历一次目录树
+        self.initial_files = set(self.snapshot)
+
+    def _scan(self):
+        snapshot = {}
+        for path in iter_pdf_files(self.root, self.exclude):
+            sig = file_signature(path)
+            if sig is not None:
+                snapshot[path] = sig
+        return snapshot
+
+    def poll(self, timeout):
+        """
+        等待最多 timeout 秒，返回发生变化的PDF路径集合
+        调用方可能频繁调用 (例如有任务在处理时)，距上次扫描不足 interval 秒时不扫描
+        """
+        remaining = self.interval - (time.monotonic() - self.last_scan)
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        current = self._scan()
+        self.last_scan = time.monotonic()
+        changed = {p for p, sig in current.items() if self.snapshot.get(p) != sig}
+        self.snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    基于Linux inotify的递归监视器 (通过ctypes调用libc，无需额外依赖)
+    每个子目录一个watch，新建的子目录会自动加入监视
+    """
+
+    def __init__(self, root, exclude=None, rescan_filter=None):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "当前系统不支持inotify")
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.root = str(root)
+        self.exclude = exclude
+        # 队列溢出后全量扫描时，只返回满足此条件的文件 (例如输出已过期)
+        self.rescan_filter = rescan_filter
+        self.watches = {}
+        # 运行中新增目录时watch数量达到上限，调用方应改用轮询
+        self.exhausted = False
+        try:
+            # 启动时已存在的文件，供调用方复用，避免再遍历一次目录树
+            self.initial_files = self._add_tree(self.root)
+        except BaseException:
+            self.close()
+            raise
+
+    def _add_watch(self, path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise OSError(err, "inotify watch数量已达上限，请调大 fs.inotify.max_user_watches")
+            logger.warning(f"无法监视目录 {path}: {os.strerror(err)}")
+            return
+        self.watches[wd] = path
+
+    def _add_tree(self, top):
+        """监视 top 及其所有子目录，返回其中已存在的PDF文件"""
+        found = set()
+        for dirpath, dirnames, filenames in os.walk(top):
+            if self.exclude:
+                dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) != self.exclude]
+            self._add_watch(dirpath)
+            found.update(os.path.join(dirpath, f) for f in filenames if is_pdf(f))
+        return found
+
+    def poll(self, timeout):
+        """等待最多 timeout 秒，返回发生变化的PDF路径集合"""
+        changed = set()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed
+
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，做一次完整扫描以免遗漏
+                    logger.warning("inotify事件队列溢出，重新扫描目录")
+                    changed.update(
+                        p for p in iter_pdf_files(self.root, self.exclude)
+                        if self.rescan_filter is None or self.rescan_filter(p))
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+
+                parent = self.watches.get(wd)
+                if parent is None or not name:
+                    continue
+                path = os.path.join(parent, os.fsdecode(name))
+
+                if mask & IN_ISDIR:
+                    # 新目录：加入监视，并收集在加入监视前已写入的文件
+                    if mask & (IN_CREATE | IN_MOVED_TO) and path != self.exclude and not self.exhausted:
+                        try:
+                            changed.update(self._add_tree(path))
+                        except OSError as e:
+                            # 继续处理已读出的事件，新目录中的文件由调用方切换到轮询后补扫
+                            logger.warning(f"无法监视新目录 {path}: {e}")
+                            self.exhausted = True
+                elif is_pdf(os.path.basename(path)):
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(root, poll_interval=5.0, exclude=None, use_inotify=True, rescan_filter=None):
+    """优先使用inotify，失败时回退到轮询"""
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root, exclude, rescan_filter)
+        except OSError as e:
+            logger.warning(f"inotify不可用 ({e})，改用轮询模式")
+    return PollingWatcher(root, poll_interval, exclude)
+
+
+def needs_update(input_path, output_path):
+    """输出文件不存在或比输入文件旧时需要重新压缩"""
+    try:
+        return os.path.getmtime(output_path) < os.path.getmtime(input_path)
+    except OSError:
+        return True
+
+
+class SourceIndex:
+    """
+    记录每个输入文件最后一次被处理时的签名 (大小, 修改时间)
+
+    用签名而不是"输出比输入新"来判断是否需要处理：mv、cp -p、rsync -a 放入的文件
+    可能保留较旧的修改时间，而压缩期间被改写的文件，其输出反而比新内容更新。
+    记录以追加方式写入输出目录下的 .watch_sources.jsonl，启动时读取并压缩为每个文件一行。
+    """
+
+    FILENAME = ".watch_sources.jsonl"
+
+    def __init__(self, output_root, input_root):
+        self.path = os.path.join(output_root, self.FILENAME)
+        self.input_root = input_root
+        self.signatures = {}
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.signatures[entry["path"]] = (entry["size"], entry["mtime_ns"])
+                    except (ValueError, KeyError, TypeError):
+                        # 最后一行可能因进程被杀而不完整
+                        continue
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for rel_path, sig in self.signatures.items():
+                    f.write(self._line(rel_path, sig))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"无法读取处理记录 {self.path}: {e}")
+
+    @staticmethod
+    def _line(rel_path, sig):
+        return json.dumps({"path": rel_path, "size": sig[0], "mtime_ns": sig[1]}, ensure_ascii=False) + "\n"
+
+    def get(self, path):
+        return self.signatures.get(os.path.relpath(path, self.input_root))
+
+    def record(self, path, sig):
+        rel_path = os.path.relpath(path, self.input_root)
+        self.signatures[rel_path] = sig
+        self._file.write(self._line(rel_path, sig))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _compress_job(input_path, output_path, method, dpi, verbose, verify=None):
+    """进程池中执行的压缩任务"""
+    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    return compress_pdf(input_path, output_path, method, dpi, verbose, verify)
+
+
+def watch_directory(input_dir, output_dir, method="advanced-gs", dpi=150, verbose=True,
+                    settle=2.0, workers=None, poll_interval=5.0, use_inotify=True,
+                    catch_up=True, stop_event=None, verify=None):
+    """
+    监视目录并压缩新增或修改的PDF文件
+
+    参数:
+    - input_dir: 输入目录路径
+    - output_dir: 输出目录路径 (保持相对路径结构)
+    - method: 压缩方法
+    - dpi: 图像分辨率 (用于img2pdf方法)
+    - verbose: 是否显示详细信息
+    - settle: 文件签名保持不变多少秒后视为写入完成
+    - workers: 压缩进程数 (默认: CPU核心数)
+    - poll_interval: 轮询模式下的扫描间隔 (秒)
+    - use_inotify: 是否尝试使用inotify
+    - catch_up: 启动时是否处理未处理过或处理后又被修改的已有文件
+    - stop_event: 可选的 threading.Event，设置后退出监视
+    - verify: 校验相似度阈值 (None表示不校验)
+    """
+    input_root = os.path.abspath(input_dir)
+    output_root = os.path.abspath(output_dir)
+    os.makedirs(output_root, exist_ok=True)
+
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    # 输出目录位于输入目录内时不监视它，避免处理自己的输出
+    exclude = output_root if output_root.startswith(input_root + os.sep) else None
+
+    def output_for(path):
+        return os.path.join(output_root, os.path.relpath(path, input_root))
+
+    sources = SourceIndex(output_root, input_root)
+
+    def is_stale(path):
+        """没有具体事件可依据时 (启动、事件队列溢出) 判断文件是否需要处理"""
+        recorded = sources.get(path)
+        if recorded is None:
+            # 没有处理记录 (例如输出由批处理模式生成) 时退回比较修改时间
+            return needs_update(path, output_for(path))
+        return file_signature(path) != recorded
+
+    watcher = create_watcher(input_root, poll_interval, exclude, use_inotify, rescan_filter=is_stale)
+    mode = "inotify" if isinstance(watcher, InotifyWatcher) else "轮询"
+    logger.info(f"开始监视 {input_root} ({mode}模式, {workers} 个压缩进程)")
+
+    pending = {}       # 路径 -> (签名, 最后一次变化时间)
+    ready = deque()    # 写入已稳定、等待提交的文件
+    queued = set()
+    in_flight = {}     # future -> 路径
+    submitted = {}     # 路径 -> 提交时的文件签名
+    success_count = 0
+    failed_count = 0
+
+    def mark_changed(path, now):
+        if path in queued:
+            # 等待提交期间又被修改：移出就绪队列，重新等待写入稳定
+            ready.remove(path)
+            queued.discard(path)
+        if path in in_flight.values():
+            # 压缩完成后比较签名决定是否重新处理
+            return
+        pending[path] = (None, now)
+
+    # 监视器建立时已经遍历过目录树，直接复用其结果
+    initial_files = watcher.initial_files
+    watcher.initial_files = None
+    if catch_up:
+        now = time.monotonic()
+        for path in initial_files:
+            if is_stale(path):
+                mark_changed(path, now)
+        if pending:
+            logger.info(f"发现 {len(pending)} 个待处理的已有文件")
+    del initial_files
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while stop_event is None or not stop_event.is_set():
+                timeout = settle / 2 if pending else poll_interval
+                if in_flight:
+                    timeout = min(timeout, 0.5)
+                changed = watcher.poll(timeout)
+                if watcher.exhausted:
+                    # inotify watch用尽: 改用轮询，并补扫一次可能遗漏的文件
+                    logger.warning("inotify watch数量已达上限，改用轮询模式 (可调大 fs.inotify.max_user_watches)")
+                    watcher.close()
+                    watcher = PollingWatcher(input_root, poll_interval, exclude)
+                    changed.update(p for p in watcher.initial_files if is_stale(p))
+                    watcher.initial_files = None
+                for path in changed:
+                    mark_changed(path, time.monotonic())
+
+                # 防抖：签名在 settle 秒内未变化才视为写入完成
+                now = time.monotonic()
+                for path, (sig, since) in list(pending.items()):
+                    current = file_signature(path)
+                    if current is None:
+                        del pending[path]
+                    elif current != sig:
+                        pending[path] = (current, now)
+                    elif now - since >= settle:
+                        del pending[path]
+                        # 内容与上次处理时相同 (例如只有访问或重复事件) 时无需处理
+                        if current != sources.get(path):
+                            ready.append(path)
+                            queued.add(path)
+
+                # 背压：进程池满时不再提交，文件留在就绪队列中
+                while ready and len(in_flight) < max_in_flight:
+                    path = ready.popleft()
+                    queued.discard(path)
+                    if verbose:
+                        logger.info(f"开始压缩: {os.path.relpath(path, input_root)}")
+                    future = pool.submit(_compress_job, path, output_for(path), method, dpi, verbose, verify)
+                    in_flight[future] = path
+                    submitted[path] = file_signature(path)
+
+                if not in_flight:
+                    continue
+                done, _ = wait(list(in_flight), timeout=0, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = in_flight.pop(future)
+                    try:
+                        success, _ = future.result()
+                    except Exception as e:
+                        logger.error(f"压缩进程异常 {path}: {e}")
+                        success = False
+                    submitted_sig = submitted.pop(path, None)
+                    if success:
+                        success_count += 1
+                        if submitted_sig is not None:
+                            sources.record(path, submitted_sig)
+                    else:
+                        failed_count += 1
+                        logger.warning(f"压缩失败: {os.path.relpath(path, input_root)}")
+                    # 输入在压缩期间被改写过时，输出对应的是旧内容，需要重新处理
+                    current = file_signature(path)
+                    if current is not None and current != submitted_sig:
+                        mark_changed(path, time.monotonic())
+    except KeyboardInterrupt:
+        logger.info("收到中断信号，停止监视")
+    finally:
+        watcher.close()
+        sources.close()
+
+    if verbose:
+        logger.info(f"监视结束: {success_count} 个文件压缩成功, {failed_count} 个失败")
+    return success_count, failed_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="监视目录并自动压缩PDF文件")
+    parser.add_argument("input", help="监视的输入目录")
+    parser.add_argument("output", help="输出目录")
+    parser.add_argument(
+        "-m", "--method",
+        choices=["advanced-gs", "qpdf", "img2pdf", "ocrmypdf", "all"],
+        default="advanced-gs",
+        help="压缩方法 (默认: advanced-gs)"
+    )
+    parser.add_argument("--dpi", type=int, default=150, help="图像分辨率 (用于img2pdf方法，默认: 150)")
+    parser.add_argument("--settle", type=float, default=2.0, help="文件写入稳定等待时间 (秒，默认: 2)")
+    parser.add_argument("--workers", type=int, help="压缩进程数 (默认: CPU核心数)")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="轮询间隔 (秒，默认: 5)")
+    parser.add_argument("--polling", action="store_true", help="强制使用轮询模式")
+    parser.add_argument("--no-catch-up", action="store_true", help="启动时不处理已有文件")
+    parser.add_argument(
+        "--verify", nargs="?", type=float, const=DEFAULT_THRESHOLD, metavar="THRESHOLD",
+        help=f"校验压缩结果，可指定相似度阈值 (默认: {DEFAULT_THRESHOLD})"
+    )
+    parser.add_argument("--scratch-root", help="临时文件根目录 (默认: /dev/shm，空间不足时改用磁盘临时目录)")
+    parser.add_argument("--scratch-quota", type=parse_size, help="单个文件可使用的scratch空间上限，例如 2G")
+    parser.add_argument("--silent", action="store_true", help="静默模式，不显示详细信息")
+
+    args = parser.parse_args()
+
+    if args.silent:
+        logger.setLevel(logging.WARNING)
+    
+    configure_scratch(args.scratch_root, args.scratch_quota)
+
+    if not os.path.isdir(args.input):
+        logger.error(f"错误: 输入目录不存在: {args.input}")
+        return
+
+    watch_directory(args.input, args.output, args.method, args.dpi, not args.silent,
+                    settle=args.settle, workers=args.workers, poll_interval=args.poll_interval,
+                    use_inotify=not args.polling, catch_up=not args.no_catch_up, verify=args.verify)
+
+if __name__ == "__main__":
+    main()
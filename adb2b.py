@@ -10,7 +10,7 @@ FilePath: /express-pdf/adb2b.py
 将books目录下的所有PDF文件压缩后输出到eBooks目录
 使用高级压缩方法
 
-使用方法: python books_to_ebooks_advanced.py [压缩方法]
+使用方法: python books_to_ebooks_advanced.py [压缩方法] [DPI] [--watch]
 
 压缩方法选项:
 - advanced-gs：使用高级Ghostscript设置（默认）
@@ -18,6 +18,8 @@ FilePath: /express-pdf/adb2b.py
 - img2pdf：转换为图像后重建PDF（文件最小但可能影响文本选择）
 - ocrmypdf：OCR处理（适合扫描文档）
 - all：尝试所有方法并选择最佳结果（推荐但较慢）
+
+--watch：持续监视books目录，自动压缩新增或修改的PDF文件
 """
 
 import os
@@ -27,6 +29,7 @@ from pathlib import Path
 
 # 导入高级PDF压缩模块
 from adMain import process_directory
+from adWatch import watch_directory
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, 
@@ -50,15 +53,19 @@ def main():
     # 确保eBooks目录存在
     ebooks_dir.mkdir(exist_ok=True)
     
+    # 分离出 --watch 开关，其余为位置参数
+    watch = "--watch" in sys.argv[1:]
+    argv = [sys.argv[0]] + [a for a in sys.argv[1:] if a != "--watch"]
+    
     # 获取压缩方法参数
     method = "advanced-gs"  # 默认方法
-    if len(sys.argv) > 1 and sys.argv[1] in ["advanced-gs", "qpdf", "img2pdf", "ocrmypdf", "all"]:
-        method = sys.argv[1]
+    if len(argv) > 1 and argv[1] in ["advanced-gs", "qpdf", "img2pdf", "ocrmypdf", "all"]:
+        method = argv[1]
     
     # 获取DPI参数（仅用于img2pdf方法）
     dpi = 150  # 默认DPI
-    if len(sys.argv) > 2 and sys.argv[2].isdigit():
-        dpi = int(sys.argv[2])
+    if len(argv) > 2 and argv[2].isdigit():
+        dpi = int(argv[2])
     
     logger.info(f"正在将books目录下的PDF文件压缩到eBooks目录")
     logger.info(f"使用压缩方法: {method}" + (f", DPI: {dpi}" if method == "img2pdf" else ""))
@@ -66,6 +73,11 @@ def main():
     # 显示依赖提示
     show_dependencies_info(method)
     
+    if watch:
+        # 监视模式：处理已有文件后持续等待新文件
+        watch_directory(str(books_dir), str(ebooks_dir), method, dpi, verbose=True)
+        return
+    
     # 调用process_directory函数处理整个目录
     process_directory(str(books_dir), str(ebooks_dir), method, dpi, verbose=True)
     
@@ -0,0 +1,192 @@
+"""
+adCluster 任务队列状态机测试 (领取 / 心跳 / 过期回收 / 提交)
+使用进程内的 MemoryQueue 和本地目录上的 LeaseDirQueue，不需要真正的压缩工具
+
+运行: python -m pytest -q test_adCluster.py
+"""
+
+import os
+import time
+
+import pytest
+
+import adCluster
+
+LEASE = 0.3
+
+
+@pytest.fixture(params=["memory", "dir"])
+def queue(request, tmp_path):
+    if request.param == "memory":
+        return adCluster.MemoryQueue(lease_seconds=LEASE)
+    return adCluster.LeaseDirQueue(tmp_path / "queue", lease_seconds=LEASE)
+
+
+def make_job(job_id, priority):
+    return {"id": job_id, "rel_path": f"{job_id}.pdf", "priority": priority, "run": "r1"}
+
+
+def test_claim_in_priority_order_and_only_once(queue):
+    queue.put(make_job("b", 1))
+    queue.put(make_job("a", 0))
+
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+
+    assert [first.job["id"], second.job["id"]] == ["a", "b"]
+    assert queue.claim("w3") is None
+    assert queue.counts() == {"pending": 0, "leased": 2, "done": 0}
+
+
+def test_complete_moves_job_to_done(queue):
+    queue.put(make_job("a", 0))
+    lease = queue.claim("w1")
+
+    assert queue.complete(lease, {"success": True})
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1}
+    assert [job["result"] for job in queue.results()] == [{"success": True}]
+    assert queue.reap_expired() == 0
+
+
+def test_heartbeat_keeps_lease_alive(queue):
+    queue.put(make_job("a", 0))
+    lease = queue.claim("w1")
+
+    for _ in range(4):
+        time.sleep(LEASE / 3)
+        assert queue.heartbeat(lease)
+        assert queue.reap_expired() == 0
+
+    assert queue.complete(lease, {"success": True})
+
+
+def test_expired_lease_is_reassigned_and_old_holder_is_fenced(queue):
+    queue.put(make_job("a", 0))
+    stale = queue.claim("w1")
+    time.sleep(LEASE + 0.1)
+
+    assert queue.reap_expired() == 1
+    assert queue.counts() == {"pending": 1, "leased": 0, "done": 0}
+
+    fresh = queue.claim("w2")
+    assert fresh.job["attempts"] == 1
+    # 失去租约的工作者既不能续约也不能提交
+    assert not queue.heartbeat(stale)
+    assert not queue.complete(stale, {"success": True})
+    assert queue.complete(fresh, {"success": True})
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1}
+
+
+def test_job_that_keeps_expiring_is_recorded_as_failed(queue):
+    queue.put(make_job("a", 0))
+
+    for attempt in range(1, adCluster.DEFAULT_MAX_ATTEMPTS + 1):
+        stale = queue.claim("w1")
+        assert stale.job.get("attempts", 0) == attempt - 1
+        time.sleep(LEASE + 0.1)
+        assert queue.reap_expired() == 1
+
+    assert queue.counts() == {"pending": 0, "leased": 0, "done": 1}
+    assert not queue.complete(stale, {"success": True})
+    # 协调者不会一直等待下去
+    assert adCluster.monitor_queue(queue, "r1", poll_interval=0, verbose=False) == (0, ["a.pdf"])
+
+
+def test_lease_dir_queue_shares_lease_seconds_through_config(tmp_path):
+    adCluster.LeaseDirQueue(tmp_path / "queue", lease_seconds=42.0)
+
+    worker_view = adCluster.LeaseDirQueue(tmp_path / "queue")
+    assert worker_view.lease_seconds == 42.0
+
+    adCluster.LeaseDirQueue(tmp_path / "queue", lease_seconds=7.0)
+    assert worker_view.lease_seconds == 7.0
+
+
+def test_coordinator_keeps_configured_lease_unless_given(tmp_path, monkeypatch):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    queue_dir = tmp_path / "queue"
+
+    def run_coordinator(*extra):
+        monkeypatch.setattr("sys.argv", ["adCluster.py", "coordinator", str(input_dir), str(tmp_path / "out"),
+                                         "--queue", str(queue_dir), "--no-wait", *extra])
+        adCluster.main()
+        return adCluster.LeaseDirQueue(queue_dir).lease_seconds
+
+    assert run_coordinator() == adCluster.DEFAULT_LEASE
+    assert run_coordinator("--lease", "600") == 600.0
+    assert run_coordinator() == 600.0
+
+
+def test_lease_dir_queue_requeues_job_lost_during_complete(tmp_path):
+    queue = adCluster.LeaseDirQueue(tmp_path / "queue", lease_seconds=LEASE)
+    queue.put(make_job("a", 0))
+    lease = queue.claim("w1")
+    # 模拟工作者在提交点 (rename为 .claimed) 之后、写入结果之前崩溃
+    os.rename(queue._leased_path("a", lease.token), queue.done_dir / f"a@{lease.token}.claimed")
+    assert queue.counts()["leased"] == 1
+
+    time.sleep(LEASE + 0.1)
+    assert queue.reap_expired() == 1
+    assert queue.counts() == {"pending": 1, "leased": 0, "done": 0}
+    assert queue.claim("w2").job["attempts"] == 1
+
+
+def test_worker_that_lost_its_lease_leaves_output_untouched(queue, tmp_path, monkeypatch):
+    input_path = tmp_path / "a.pdf"
+    input_path.write_bytes(b"0" * 100)
+    output_path = tmp_path / "out" / "a.pdf"
+    output_path.parent.mkdir()
+    output_path.write_bytes(b"old")
+    queue.put(dict(make_job("a", 0), input=str(input_path), output=str(output_path),
+                   method="qpdf", dpi=150))
+
+    def slow_compress(input_path, output_path, method, dpi, verbose, verify=None):
+        # 处理期间租约过期并被回收，心跳间隔很长，工作者还没有发现
+        time.sleep(LEASE + 0.1)
+        assert queue.reap_expired() == 1
+        with open(output_path, "wb") as f:
+            f.write(b"new")
+        return True, 99.0
+
+    monkeypatch.setattr(adCluster, "compress_pdf", slow_compress)
+    lease = queue.claim("w1")
+    monkeypatch.setattr(queue, "claim", lambda worker_id, leases=[lease]: leases.pop() if leases else None)
+
+    assert adCluster.run_worker(queue, worker_id="w1", heartbeat_interval=60, idle_exit=True) == 0
+    assert output_path.read_bytes() == b"old"
+    assert os.listdir(output_path.parent) == ["a.pdf"]
+
+
+def test_enqueue_skips_queued_files_but_allows_reprocessing(queue, tmp_path, monkeypatch):
+    input_dir = tmp_path / "in"
+    (input_dir / "sub").mkdir(parents=True)
+    for name in ("a.pdf", "sub/b.pdf"):
+        (input_dir / name).write_bytes(b"0" * 100)
+
+    def fake_compress(input_path, output_path, method, dpi, verbose, verify=None):
+        with open(output_path, "wb") as f:
+            f.write(b"1")
+        return True, 99.0
+
+    monkeypatch.setattr(adCluster, "compress_pdf", fake_compress)
+    output_dir = tmp_path / "out"
+
+    for run_id in ("r1", "r2"):
+        assert adCluster.enqueue_directory(queue, input_dir, output_dir, run_id=run_id) == 2
+        assert adCluster.enqueue_directory(queue, input_dir, output_dir, run_id=run_id) == 0
+        assert adCluster.run_worker(queue, worker_id="w", idle_exit=True) == 2
+        assert adCluster.monitor_queue(queue, run_id, poll_interval=0, verbose=False) == (2, [])
+
+    assert (output_dir / "sub" / "b.pdf").read_bytes() == b"1"
+
+
+def test_coordinators_with_different_roots_do_not_share_jobs(queue, tmp_path):
+    for name in ("books", "papers"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "a.pdf").write_bytes(b"0" * 100)
+
+    assert adCluster.enqueue_directory(queue, tmp_path / "books", tmp_path / "out1", run_id="r1") == 1
+    assert adCluster.enqueue_directory(queue, tmp_path / "papers", tmp_path / "out2", run_id="r2") == 1
+    assert adCluster.enqueue_directory(queue, tmp_path / "books", tmp_path / "out3", run_id="r3") == 1
+    assert queue.counts()["pending"] == 3